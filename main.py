@@ -1,4 +1,7 @@
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 import uvicorn
 from dotenv import load_dotenv
@@ -7,17 +10,34 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Importa la configuración centralizada
-from src.config import settings
+from src.config import get_settings
 
 # Importaremos los routers de la API aquí cuando estén creados.
 # Por ahora, esta línea está comentada para evitar errores.
 from src.api.v1.query import router as query_router
+from src.core.pipeline_manager import pipeline_manager
+from src.core.pipelines import close_batching_embedders, configure_torch_threads
+
+settings = get_settings()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Al arrancar configura los hilos de PyTorch y construye los pipelines de
+    PREWARM_PIPELINES, para que la primera consulta no pague la carga de modelos.
+    Al cerrar detiene los hilos de batching de embeddings.
+    """
+    configure_torch_threads()
+    await asyncio.to_thread(pipeline_manager.prewarm, settings.PREWARM_PIPELINES)
+    yield
+    await asyncio.to_thread(close_batching_embedders)
 
 # Crea la instancia de la aplicación FastAPI
 app = FastAPI(
     title="AI API Modules",
     description="API modular para procesos de Retrieval-Augmented Generation (RAG).",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 # Aquí incluiremos los routers de la API.
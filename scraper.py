@@ -5,29 +5,153 @@ Navega automáticamente por sitios web, extrae contenido relevante
 y genera datasets listos para procesos RAG.
 """
 
+import asyncio
+import codecs
+import aiohttp
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
+from pybloom_live import ScalableBloomFilter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from urllib.parse import urljoin, urlparse, parse_qs
-import pandas as pd
-import json
+from urllib.parse import urljoin, urlparse, urlunparse, urldefrag, parse_qs, parse_qsl, urlencode
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import orjson
 import time
 import re
 import logging
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Set, Optional
-import hashlib
+from collections import OrderedDict
+from itertools import islice
+from dataclasses import dataclass
+from typing import List, Dict, Set, Optional, Union, FrozenSet, Tuple, Iterable, Iterator
+import xxhash
 from pathlib import Path
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Reintentos con Selenium sin mejora tras los que se deja de usar en un host
+SELENIUM_MAX_MISSES = 2
+
+# Expresiones regulares compiladas una sola vez (se usan en cada página/URL)
+_SPACES_RE = re.compile(r' {2,}')
+# Espacios alrededor de un salto de línea, y tres o más saltos seguidos (un párrafo son dos)
+_NEWLINE_SPACES_RE = re.compile(r' *\n *')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_ONCLICK_URL_RE = re.compile(r"location\.href\s*=\s*['\"]([^'\"]+)['\"]")
+_CHARSET_RE = re.compile(r'charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Devuelve el charset declarado en una cabecera Content-Type, si lo hay"""
+    match = _CHARSET_RE.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def resolve_encoding(html: bytes, charset: Optional[str] = None) -> str:
+    """
+    Elige la codificación del HTML como un navegador: charset de la cabecera HTTP,
+    luego <meta charset> y, si no hay ninguno, UTF-8 (nunca el Latin-1 de libxml2)
+    """
+    if not charset:
+        match = _META_CHARSET_RE.search(html, 0, 2048)
+        charset = match.group(1).decode('ascii') if match else None
+    if not charset:
+        return 'utf-8'
+    try:
+        # Se valida con Python pero se conserva el nombre web (el que entiende libxml2)
+        codecs.lookup(charset)
+        return charset
+    except LookupError:
+        return 'utf-8'
+
+
+# Puntuación que se conserva al limpiar texto (además de letras, dígitos, '_' y espacios)
+_ALLOWED_PUNCTUATION = '.,!?;:-()[]{}"\'/@#$%&*+=<>|~`^'
+
+
+def _clean_char(char: str) -> Optional[str]:
+    """Clasifica un carácter para clean_text: se conserva, pasa a ' ' o se elimina (None)"""
+    if char == '\n' or char == '_' or char.isalnum() or char in _ALLOWED_PUNCTUATION:
+        return char
+    return ' ' if char.isspace() else None
+
+
+# str.translate solo va por su camino rápido en C con texto ASCII, así que la tabla
+# cubre ASCII; el texto con otros caracteres se limpia con dos expresiones regulares
+_ASCII_CLEAN_TABLE = {codepoint: _clean_char(chr(codepoint)) for codepoint in range(128)}
+_JUNK_RE = re.compile(r'[^\w\s' + re.escape(_ALLOWED_PUNCTUATION) + ']')
+_OTHER_SPACES_RE = re.compile(r'[^\S\n ]')
+
+
+def split_selectors(selectors: List[str]) -> Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str]]:
+    """Separa selectores simples ('tag', '.clase', '#id') en conjuntos de búsqueda O(1)"""
+    tags, classes, ids = set(), set(), set()
+    for selector in selectors:
+        if selector.startswith('.'):
+            classes.add(selector[1:])
+        elif selector.startswith('#'):
+            ids.add(selector[1:])
+        else:
+            tags.add(selector.lower())
+    return frozenset(tags), frozenset(classes), frozenset(ids)
+
+def element_matches(elem, tags: FrozenSet[str], classes: FrozenSet[str], ids: FrozenSet[str]) -> bool:
+    """Indica si un elemento lxml coincide con alguno de los selectores simples"""
+    if elem.tag in tags:
+        return True
+    if ids and elem.get('id') in ids:
+        return True
+    class_attr = elem.get('class')
+    return bool(class_attr) and not classes.isdisjoint(class_attr.split())
+
+class SeenFilter:
+    """
+    Conjunto aproximado para deduplicar URLs y hashes con memoria acotada.
+    
+    Usa un filtro Bloom escalable (~10 bits por elemento) más una cola exacta con
+    las últimas claves añadidas, que resuelve sin hashing los enlaces que se repiten
+    en todas las páginas (menús, pie). Un falso positivo solo implica omitir una página.
+    """
+    def __init__(self, initial_capacity: int = 10_000, error_rate: float = 1e-4, recent_size: int = 1024):
+        self._bloom = ScalableBloomFilter(initial_capacity=initial_capacity, error_rate=error_rate)
+        self._recent: OrderedDict = OrderedDict()
+        self._recent_size = recent_size
+        self._count = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._recent or key in self._bloom
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, key: str) -> None:
+        if not self._bloom.add(key):  # add() devuelve True si ya estaba
+            self._count += 1
+        self._recent[key] = None
+        if len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+
+def build_ignore_xpath(classes: FrozenSet[str], ids: FrozenSet[str]) -> Optional[str]:
+    """Construye una única expresión XPath que selecciona los elementos ignorados por clase o id"""
+    conditions = [f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in sorted(classes)]
+    conditions += [f"@id='{name}'" for name in sorted(ids)]
+    return f"//*[{' or '.join(conditions)}]" if conditions else None
+
 @dataclass
 class ScrapedContent:
     """Estructura para almacenar contenido extraído"""
@@ -39,24 +163,42 @@ class ScrapedContent:
     content_hash: str
 
 class WebScraperRAG:
-    def __init__(self, base_url: str, max_depth: int = 3, delay: float = 1.0):
+    def __init__(self, base_url: str, max_depth: int = 3, delay: float = 1.0, max_workers: int = 8):
         """
         Inicializa el scraper
         
         Args:
             base_url: URL base del sitio a scrapear
             max_depth: Profundidad máxima de navegación
-            delay: Delay entre requests (respeto por el servidor)
+            delay: Delay entre requests de cada worker (respeto por el servidor)
+            max_workers: Número de páginas que se descargan en paralelo
         """
         self.base_url = base_url
-        self.domain = urlparse(base_url).netloc
+        # El dominio sale de la forma canónica, igual que las claves de visitados
+        self.domain = urlparse(self._canonicalize(base_url)).netloc
         self.max_depth = max_depth
         self.delay = delay
-        self.visited_urls: Set[str] = set()
+        self.max_workers = max_workers
+        self.visited_bloom = SeenFilter(initial_capacity=10_000, error_rate=1e-4)
         self.scraped_data: List[ScrapedContent] = []
+        self._seen_hashes = SeenFilter(initial_capacity=10_000, error_rate=1e-4)
+        
+        # Sesión HTTP compartida: reutiliza conexiones TCP/TLS entre páginas
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10, pool_maxsize=50,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        )
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({**DEFAULT_HEADERS, 'Accept-Encoding': 'gzip, deflate'})
         
-        # Configurar Selenium
-        self.setup_selenium()
+        # Selenium se inicializa de forma perezosa (ver la propiedad `driver`)
+        self._driver = None
+        self._driver_ready = False
+        self._driver_host: Optional[str] = None
+        self._selenium_useful_hosts: Set[str] = set()
+        self._selenium_misses: Dict[str, int] = {}
         
         # Patrones para identificar contenido relevante
         self.content_selectors = [
@@ -76,6 +218,22 @@ class WebScraperRAG:
             r'/download/', r'/api/', r'/ajax/', r'#', r'javascript:',
             r'mailto:', r'tel:'
         ]
+        # Una sola alternancia compilada en lugar de N búsquedas por URL
+        self._avoid_re = re.compile('|'.join(self.url_patterns_to_avoid), re.IGNORECASE)
+        
+        # Selectores precalculados: conjuntos para el contenido; para lo ignorado,
+        # etiquetas que se eliminan en C y una sola expresión XPath para clases/ids
+        self._content_match = split_selectors(self.content_selectors)
+        self._ignore_tags, ignore_classes, ignore_ids = split_selectors(self.ignore_selectors)
+        self._ignore_xpath = build_ignore_xpath(ignore_classes, ignore_ids)
+
+    @property
+    def driver(self):
+        """Driver de Selenium compartido, creado solo en el primer uso"""
+        if not self._driver_ready:
+            self._driver_ready = True
+            self.setup_selenium()
+        return self._driver
 
     def setup_selenium(self):
         """Configura el driver de Selenium"""
@@ -88,81 +246,145 @@ class WebScraperRAG:
         options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
         
         try:
-            self.driver = webdriver.Chrome(options=options)
-            self.driver.set_page_load_timeout(30)
+            self._driver = webdriver.Chrome(options=options)
+            self._driver.set_page_load_timeout(30)
         except Exception as e:
             logger.error(f"Error configurando Selenium: {e}")
-            self.driver = None
+            self._driver = None
 
-    def is_valid_url(self, url: str) -> bool:
-        """Verifica si una URL es válida para scrapear"""
-        if not url or url in self.visited_urls:
+    def is_valid_url(self, url: str, key: Optional[str] = None) -> bool:
+        """Verifica si una URL es válida para scrapear (`key`: su forma canónica, si ya se tiene)"""
+        if not url:
+            return False
+        key = key or self._canonicalize(url)
+        if key in self.visited_bloom:
             return False
             
         # Verificar patrones a evitar
-        for pattern in self.url_patterns_to_avoid:
-            if re.search(pattern, url, re.IGNORECASE):
-                return False
+        if self._avoid_re.search(url):
+            return False
         
         # Solo URLs del mismo dominio
-        parsed = urlparse(url)
+        parsed = urlparse(key)
         return parsed.netloc == self.domain or parsed.netloc == ''
 
-    def extract_links(self, soup: BeautifulSoup, current_url: str) -> List[str]:
-        """Extrae todos los enlaces válidos de una página"""
-        links = []
+    def _canonicalize(self, url: str) -> str:
+        """
+        Normaliza una URL para que sus variantes equivalentes compartan una sola clave.
+        Solo sirve como clave de visitados: se descarga y se resuelven enlaces con la URL real
+        """
+        url, _ = urldefrag(url)
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        netloc = parsed.netloc.lower()
         
-        # Enlaces en <a> tags
-        for link in soup.find_all('a', href=True):
-            url = urljoin(current_url, link['href'])
-            if self.is_valid_url(url):
-                links.append(url)
+        # Quitar puertos por defecto
+        if (scheme == 'http' and netloc.endswith(':80')) or (scheme == 'https' and netloc.endswith(':443')):
+            netloc = netloc.rsplit(':', 1)[0]
         
-        # Botones con onclick o data attributes que puedan contener URLs
-        for button in soup.find_all(['button', 'div'], {'onclick': True}):
-            onclick = button.get('onclick', '')
-            url_match = re.search(r"location\.href\s*=\s*['\"]([^'\"]+)['\"]", onclick)
-            if url_match:
-                url = urljoin(current_url, url_match.group(1))
-                if self.is_valid_url(url):
-                    links.append(url)
+        # '/a/' y '/a' apuntan a la misma página
+        path = parsed.path or '/'
+        if len(path) > 1:
+            path = path.rstrip('/') or '/'
         
-        return list(set(links))  # Remover duplicados
-
-    def extract_content(self, soup: BeautifulSoup, url: str) -> ScrapedContent:
-        """Extrae el contenido relevante de una página"""
+        # Orden estable de los parámetros: ?b=1&a=2 == ?a=2&b=1
+        query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
         
-        # Remover elementos no deseados
-        for selector in self.ignore_selectors:
-            for element in soup.select(selector):
-                element.decompose()
+        return urlunparse((scheme, netloc, path, parsed.params, query, ''))
+
+    def extract_links(self, hrefs: Iterable[str], current_url: str) -> Iterator[Tuple[str, str]]:
+        """
+        Resuelve y filtra, de forma perezosa, los enlaces crudos encontrados al parsear una página.
+        Devuelve pares (url, clave canónica); `current_url` debe ser la URL real de la respuesta
+        """
+        seen_local: Set[str] = set()
+        for href in hrefs:
+            url, _ = urldefrag(urljoin(current_url, href))
+            key = self._canonicalize(url)
+            if key in seen_local:  # Remover duplicados dentro de la página
+                continue
+            seen_local.add(key)
+            if self.is_valid_url(url, key):
+                yield url, key
+
+    def extract_content(self, html: Union[bytes, str], url: str,
+                        hrefs: Optional[List[str]] = None,
+                        charset: Optional[str] = None) -> ScrapedContent:
+        """
+        Extrae el contenido relevante de una página recorriendo el árbol una sola vez
         
-        # Extraer título
-        title = ""
-        title_tag = soup.find('title')
-        if title_tag:
-            title = title_tag.get_text().strip()
+        Si se pasa la lista `hrefs`, se rellena con los enlaces crudos (<a href> y
+        location.href en onclick) del mismo árbol, sin volver a parsear.
+        `charset` es el de la cabecera Content-Type de la respuesta, si lo declara.
+        """
+        # El HTML de Selenium llega como str: se fuerza UTF-8 por encima del <meta charset>
+        if isinstance(html, str):
+            html, encoding = html.encode('utf-8'), 'utf-8'
         else:
-            h1 = soup.find('h1')
-            if h1:
-                title = h1.get_text().strip()
+            encoding = resolve_encoding(html, charset)
+        try:
+            parser = lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
+            parser = lxml.html.HTMLParser(encoding='utf-8')
         
-        # Extraer contenido principal
+        title = ""
+        h1_title = ""
+        og_meta = {}
         content_parts = []
+        body_text = ""
         
-        # Buscar contenido por selectores prioritarios
-        for selector in self.content_selectors:
-            elements = soup.select(selector)
-            for element in elements:
-                text = element.get_text().strip()
-                if len(text) > 50:  # Solo texto significativo
-                    content_parts.append(text)
+        try:
+            tree = lxml.html.document_fromstring(html, parser=parser)
+            
+            # Los enlaces se recogen antes de podar: nav/header/footer también los tienen
+            if hrefs is not None:
+                for elem in tree.iter('a', 'button', 'div'):
+                    if elem.tag == 'a':
+                        if elem.get('href'):
+                            hrefs.append(elem.get('href'))
+                    elif elem.get('onclick'):
+                        url_match = _ONCLICK_URL_RE.search(elem.get('onclick'))
+                        if url_match:
+                            hrefs.append(url_match.group(1))
+            
+            # Remover elementos no deseados: etiquetas en una pasada en C,
+            # clases/ids con una sola consulta XPath (conservando el texto posterior)
+            etree.strip_elements(tree, *self._ignore_tags, with_tail=False)
+            if self._ignore_xpath:
+                for elem in tree.xpath(self._ignore_xpath):
+                    if elem.getparent() is not None:
+                        elem.drop_tree()
+            
+            for event, elem in etree.iterwalk(tree, events=('start', 'end')):
+                tag = elem.tag
+                
+                if event == 'start':
+                    if tag == 'meta' and elem.get('property') in ('og:title', 'og:description'):
+                        og_meta[elem.get('property')] = elem.get('content', '')
+                    continue
+                
+                # Evento 'end': el subárbol del elemento ya fue recorrido
+                if tag == 'title' and not title:
+                    title = ''.join(elem.itertext()).strip()
+                elif tag == 'h1' and not h1_title:
+                    h1_title = ''.join(elem.itertext()).strip()
+                
+                if element_matches(elem, *self._content_match):
+                    text = ''.join(elem.itertext()).strip()
+                    if len(text) > 50:  # Solo texto significativo
+                        content_parts.append(text)
+                        # Vaciar el subárbol: su texto ya no se repite en los ancestros
+                        elem.clear(keep_tail=True)
+                elif tag == 'body' and not content_parts:
+                    body_text = ''.join(elem.itertext())
+        except etree.LxmlError as e:
+            logger.warning(f"HTML inválido o vacío en {url}: {e}")
+        
+        title = title or h1_title
         
         # Si no encontramos contenido, usar todo el texto del body
-        if not content_parts:
-            body = soup.find('body')
-            if body:
-                content_parts.append(body.get_text())
+        if not content_parts and body_text:
+            content_parts.append(body_text)
         
         # Limpiar y combinar contenido
         content = self.clean_text('\n\n'.join(content_parts))
@@ -174,19 +396,17 @@ class WebScraperRAG:
             'word_count': len(content.split()),
             'char_count': len(content),
             'title_length': len(title),
-            'extraction_method': 'beautifulsoup'
+            'extraction_method': 'lxml'
         }
         
         # Agregar metadata de OpenGraph si existe
-        og_title = soup.find('meta', property='og:title')
-        og_description = soup.find('meta', property='og:description')
-        if og_title:
-            metadata['og_title'] = og_title.get('content', '')
-        if og_description:
-            metadata['og_description'] = og_description.get('content', '')
+        if 'og:title' in og_meta:
+            metadata['og_title'] = og_meta['og:title']
+        if 'og:description' in og_meta:
+            metadata['og_description'] = og_meta['og:description']
         
         # Hash del contenido para evitar duplicados
-        content_hash = hashlib.md5(content.encode()).hexdigest()
+        content_hash = xxhash.xxh3_128(content.encode()).hexdigest()
         
         return ScrapedContent(
             url=url,
@@ -199,26 +419,28 @@ class WebScraperRAG:
 
     def clean_text(self, text: str) -> str:
         """Limpia y normaliza el texto extraído"""
-        # Remover espacios extra y saltos de línea múltiples
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'\n\s*\n', '\n\n', text)
+        # Remover caracteres especiales problemáticos y convertir otros espacios en ' '
+        if text.isascii():
+            text = text.translate(_ASCII_CLEAN_TABLE)
+        else:
+            text = _JUNK_RE.sub('', text)
+            text = _OTHER_SPACES_RE.sub(' ', text)
         
-        # Remover caracteres especiales problemáticos
-        text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)\[\]\{\}\"\'\/\@\#\$\%\&\*\+\=\<\>\|\~\`\^\n]', '', text)
+        # Remover espacios extra y saltos de línea múltiples
+        text = _SPACES_RE.sub(' ', text)
+        text = _NEWLINE_SPACES_RE.sub('\n', text)
+        text = _BLANK_LINES_RE.sub('\n\n', text)
         
         return text.strip()
 
     def scrape_with_requests(self, url: str) -> Optional[ScrapedContent]:
         """Scrapea una página usando requests (más rápido)"""
         try:
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            return self.extract_content(soup, url)
+            charset = charset_from_content_type(response.headers.get('Content-Type'))
+            return self.extract_content(response.content, url, charset=charset)
             
         except Exception as e:
             logger.warning(f"Error con requests en {url}: {e}")
@@ -230,6 +452,13 @@ class WebScraperRAG:
             return None
             
         try:
+            # Reutilizar el driver entre sitios, pero sin arrastrar su estado
+            host = urlparse(url).netloc
+            if self._driver_host is not None and host != self._driver_host:
+                self.driver.delete_all_cookies()
+                self.driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            self._driver_host = host
+            
             self.driver.get(url)
             
             # Esperar a que cargue el contenido principal
@@ -252,8 +481,7 @@ class WebScraperRAG:
                 except:
                     pass
             
-            soup = BeautifulSoup(self.driver.page_source, 'html.parser')
-            content = self.extract_content(soup, url)
+            content = self.extract_content(self.driver.page_source, url)
             content.metadata['extraction_method'] = 'selenium'
             
             return content
@@ -262,6 +490,30 @@ class WebScraperRAG:
             logger.warning(f"Error con Selenium en {url}: {e}")
             return None
 
+    def should_try_selenium(self, url: str, content: Optional[ScrapedContent]) -> bool:
+        """Decide si vale la pena reintentar una página con Selenium"""
+        if content and len(content.content) >= 200:
+            return False
+        
+        host = urlparse(url).netloc
+        if host in self._selenium_useful_hosts:
+            return True
+        # Si Selenium nunca ha mejorado el resultado en este host, no se sigue intentando
+        return self._selenium_misses.get(host, 0) < SELENIUM_MAX_MISSES
+
+    def selenium_fallback(self, url: str, content: Optional[ScrapedContent]) -> Optional[ScrapedContent]:
+        """Reintenta con Selenium y devuelve el mejor de los dos resultados"""
+        selenium_content = self.scrape_with_selenium(url)
+        
+        host = urlparse(url).netloc
+        previous_length = len(content.content) if content else 0
+        if selenium_content and len(selenium_content.content) > previous_length:
+            self._selenium_useful_hosts.add(host)
+            return selenium_content
+        
+        self._selenium_misses[host] = self._selenium_misses.get(host, 0) + 1
+        return content
+
     def scrape_page(self, url: str) -> Optional[ScrapedContent]:
         """Scrapea una página probando diferentes métodos"""
         logger.info(f"Scrapeando: {url}")
@@ -270,47 +522,119 @@ class WebScraperRAG:
         content = self.scrape_with_requests(url)
         
         # Si falla o el contenido es muy poco, usar Selenium
-        if not content or len(content.content) < 200:
-            content = self.scrape_with_selenium(url)
+        if self.should_try_selenium(url, content):
+            content = self.selenium_fallback(url, content)
         
         if content and len(content.content) > 50:
             return content
         
         return None
 
-    def crawl(self, start_url: str = None, depth: int = 0) -> None:
-        """Crawlea el sitio web recursivamente"""
-        if start_url is None:
-            start_url = self.base_url
-            
-        if depth > self.max_depth or start_url in self.visited_urls:
-            return
-        
-        self.visited_urls.add(start_url)
-        
-        # Scrapear la página actual
-        content = self.scrape_page(start_url)
-        if content:
+    async def fetch_async(self, session: aiohttp.ClientSession,
+                          url: str) -> Optional[Tuple[bytes, Optional[str], str]]:
+        """
+        Descarga una página con aiohttp (no bloquea el event loop);
+        devuelve (html, charset, URL final tras las redirecciones)
+        """
+        try:
+            async with session.get(url) as response:
+                response.raise_for_status()
+                # Solo el charset declarado en la cabecera; si falta, se resuelve al parsear
+                return await response.read(), response.charset, str(response.url)
+        except Exception as e:
+            logger.warning(f"Error con aiohttp en {url}: {e}")
+            return None
+
+    def parse_page(self, html: bytes, url: str, with_links: bool = True,
+                   charset: Optional[str] = None, response_url: Optional[str] = None):
+        """
+        Parsea el HTML una sola vez y devuelve (contenido, enlaces); los enlaces
+        relativos se resuelven contra `response_url` (la URL final), o `url` si falta
+        """
+        hrefs = [] if with_links else None
+        content = self.extract_content(html, url, hrefs, charset)
+        links = self.extract_links(hrefs, response_url or url) if with_links else iter(())
+        return content, links
+
+    async def _crawl_url(self, session: aiohttp.ClientSession, queue: asyncio.Queue,
+                         selenium_lock: asyncio.Lock, url: str, depth: int) -> None:
+        """Procesa una URL de la cola y encola sus enlaces"""
+        logger.info(f"Scrapeando: {url}")
+
+        content, links = None, iter(())
+        page = await self.fetch_async(session, url)
+        if page is not None:
+            html, charset, response_url = page
+            # El parseo es CPU-bound: se ejecuta fuera del event loop
+            content, links = await asyncio.to_thread(
+                self.parse_page, html, url, depth < self.max_depth, charset, response_url
+            )
+
+        # Si falla o el contenido es muy poco, usar Selenium (un único driver compartido)
+        if self.should_try_selenium(url, content):
+            async with selenium_lock:
+                content = await asyncio.to_thread(self.selenium_fallback, url, content)
+
+        if content and len(content.content) > 50:
             # Verificar duplicados por hash
-            existing_hashes = {item.content_hash for item in self.scraped_data}
-            if content.content_hash not in existing_hashes:
+            if content.content_hash not in self._seen_hashes:
+                self._seen_hashes.add(content.content_hash)
                 self.scraped_data.append(content)
                 logger.info(f"Contenido extraído: {len(content.content)} caracteres")
-        
-        # Encontrar enlaces para continuar el crawling
-        if depth < self.max_depth:
+
+        # Limitar enlaces por página: el generador solo procesa los necesarios
+        for link, key in islice(links, 10):
+            if key not in self.visited_bloom:
+                self.visited_bloom.add(key)
+                queue.put_nowait((link, depth + 1))
+
+        await asyncio.sleep(self.delay)
+
+    async def _crawl_worker(self, session: aiohttp.ClientSession, queue: asyncio.Queue,
+                            selenium_lock: asyncio.Lock) -> None:
+        """Worker que consume URLs de la cola hasta ser cancelado"""
+        while True:
+            url, depth = await queue.get()
             try:
-                response = requests.get(start_url, timeout=10)
-                soup = BeautifulSoup(response.content, 'html.parser')
-                links = self.extract_links(soup, start_url)
-                
-                for link in links[:10]:  # Limitar enlaces por página
-                    if link not in self.visited_urls:
-                        time.sleep(self.delay)
-                        self.crawl(link, depth + 1)
-                        
+                await self._crawl_url(session, queue, selenium_lock, url, depth)
             except Exception as e:
-                logger.error(f"Error obteniendo enlaces de {start_url}: {e}")
+                logger.error(f"Error procesando {url}: {e}")
+            finally:
+                queue.task_done()
+
+    async def crawl_async(self, start_url: str = None) -> None:
+        """Crawlea el sitio web en anchura con un pool de workers concurrentes"""
+        start_url = self.base_url if start_url is None else start_url
+        start_key = self._canonicalize(start_url)
+
+        if start_key in self.visited_bloom:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self.visited_bloom.add(start_key)
+        queue.put_nowait((start_url, 0))
+
+        selenium_lock = asyncio.Lock()
+        connector = aiohttp.TCPConnector(limit_per_host=8, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=10)
+
+        async with aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS,
+                                         timeout=timeout) as session:
+            # El número de workers acota las descargas simultáneas
+            workers = [
+                asyncio.create_task(self._crawl_worker(session, queue, selenium_lock))
+                for _ in range(self.max_workers)
+            ]
+            try:
+                await queue.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    def crawl(self, start_url: str = None) -> None:
+        """Crawlea el sitio web (envoltorio síncrono de crawl_async)"""
+        asyncio.run(self.crawl_async(start_url))
 
     def save_dataset(self, output_path: str = None) -> str:
         """Guarda el dataset en múltiples formatos"""
@@ -326,24 +650,33 @@ class WebScraperRAG:
         output_dir = Path(output_path)
         output_dir.mkdir(exist_ok=True)
         
-        # Convertir a lista de diccionarios
-        data_dicts = [asdict(item) for item in self.scraped_data]
+        # Convertir a lista de diccionarios (copia superficial: sin campos anidados que clonar)
+        data_dicts = [dict(vars(item)) for item in self.scraped_data]
         
         # Guardar en JSON (formato completo)
         json_path = output_dir / "dataset.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data_dicts, f, ensure_ascii=False, indent=2)
+        with open(json_path, 'wb') as f:
+            f.write(orjson.dumps(data_dicts, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         
-        # Guardar en CSV (versión simplificada)
-        df = pd.DataFrame(data_dicts)
+        # Tabla columnar Arrow, compartida por CSV y Parquet
+        table = pa.Table.from_pylist(data_dicts)
+        
+        # Guardar en CSV (versión simplificada). CSV no admite columnas anidadas,
+        # así que metadata se escribe como JSON
         csv_path = output_dir / "dataset.csv"
-        df.to_csv(csv_path, index=False, encoding='utf-8')
+        metadata_json = pa.array([orjson.dumps(item['metadata']).decode() for item in data_dicts])
+        csv_table = table.set_column(table.schema.get_field_index('metadata'), 'metadata', metadata_json)
+        pa_csv.write_csv(csv_table, csv_path)
+        
+        # Guardar en Parquet (columnar y comprimido, para ingesta con Arrow/Polars)
+        parquet_path = output_dir / "dataset.parquet"
+        pq.write_table(table, parquet_path, compression='zstd')
         
         # Guardar en formato JSONL (ideal para RAG)
         jsonl_path = output_dir / "dataset.jsonl"
-        with open(jsonl_path, 'w', encoding='utf-8') as f:
+        with open(jsonl_path, 'wb') as f:
             for item in data_dicts:
-                f.write(json.dumps(item, ensure_ascii=False) + '\n')
+                f.write(orjson.dumps(item, option=orjson.OPT_NON_STR_KEYS) + b'\n')
         
         # Guardar solo texto plano (para algunos sistemas RAG)
         txt_path = output_dir / "corpus.txt"
@@ -359,14 +692,14 @@ class WebScraperRAG:
             'total_words': sum(len(item.content.split()) for item in self.scraped_data),
             'total_chars': sum(len(item.content) for item in self.scraped_data),
             'average_words_per_page': sum(len(item.content.split()) for item in self.scraped_data) / len(self.scraped_data),
-            'urls_visited': len(self.visited_urls),
+            'urls_visited': len(self.visited_bloom),
             'domain': self.domain,
             'timestamp': datetime.now().isoformat()
         }
         
         stats_path = output_dir / "stats.json"
-        with open(stats_path, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+        with open(stats_path, 'wb') as f:
+            f.write(orjson.dumps(stats, option=orjson.OPT_INDENT_2))
         
         logger.info(f"Dataset guardado en: {output_dir}")
         logger.info(f"Páginas procesadas: {stats['total_pages']}")
@@ -376,8 +709,10 @@ class WebScraperRAG:
 
     def close(self):
         """Cierra recursos"""
-        if self.driver:
-            self.driver.quit()
+        self.session.close()
+        # No usar la propiedad: crearía un driver solo para cerrarlo
+        if self._driver:
+            self._driver.quit()
 
 def main():
     """Función principal para ejecutar el scraper"""
@@ -386,9 +721,10 @@ def main():
     BASE_URL = "https://valparaisoweb.cl/"  # Cambiar por la URL objetivo
     MAX_DEPTH = 2
     DELAY = 1.0
+    MAX_WORKERS = 8
     
     # Crear y ejecutar scraper
-    scraper = WebScraperRAG(BASE_URL, max_depth=MAX_DEPTH, delay=DELAY)
+    scraper = WebScraperRAG(BASE_URL, max_depth=MAX_DEPTH, delay=DELAY, max_workers=MAX_WORKERS)
     
     try:
         logger.info(f"Iniciando scraping de: {BASE_URL}")
@@ -1,29 +1,65 @@
 
 
 import os
+import sys
+import math
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
 from dotenv import load_dotenv
 
 # Load environment variables from .env file before anything else.
 # This makes them available to the entire application.
 load_dotenv()
 
-from haystack import Pipeline
+from haystack import Pipeline, Document
 from haystack.components.preprocessors import DocumentCleaner, DocumentSplitter
 from haystack.components.writers import DocumentWriter
 from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
 from haystack.document_stores.types import DuplicatePolicy
 from haystack_integrations.components.embedders.fastembed import FastembedSparseDocumentEmbedder
+from qdrant_client.http import models as qdrant_models
 
 # Import the new factory for document embedders
-from src.core.pipelines import get_document_embedder
-from src.config import settings
+from src.core.pipelines import configure_torch_threads, get_document_embedder
+from src.config import get_settings
+from src.services.document_store import qdrant_connection_kwargs
 from .loaders import get_loader
 
+# --- Embeddings densos en paralelo ---
+
+def _embed_shard(documents: List[Document], num_threads: int) -> List[Document]:
+    """Embebe un fragmento de documentos en un proceso hijo con su propio embedder."""
+    # get_document_embedder() ya devuelve el embedder cargado (warm_up incluido)
+    embedder = get_document_embedder()
+    # Después de construirlo, para que prevalezca sobre TORCH_NUM_THREADS del builder
+    if "torch" in sys.modules:
+        import torch
+        # Evitar que cada proceso lance tantos hilos como núcleos (sobresuscripción)
+        torch.set_num_threads(num_threads)
+    return embedder.run(documents=documents)["documents"]
+
+def embed_documents(documents: List[Document], workers: int) -> List[Document]:
+    """Calcula los embeddings densos, repartiendo los documentos entre `workers` procesos."""
+    if workers <= 1 or len(documents) < 2:
+        embedder = get_document_embedder()
+        return embedder.run(documents=documents)["documents"]
+
+    workers = min(workers, len(documents))
+    shard_size = math.ceil(len(documents) / workers)
+    shards = [documents[i:i + shard_size] for i in range(0, len(documents), shard_size)]
+    num_threads = max(1, (os.cpu_count() or 1) // len(shards))
+
+    print(f"Calculando embeddings en {len(shards)} procesos ({num_threads} hilo(s) cada uno)...")
+    with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+        results = executor.map(_embed_shard, shards, [num_threads] * len(shards))
+        return [doc for shard in results for doc in shard]
+
 # --- Script Principal de Ingesta ---
 
-def run_ingestion_pipeline(collection_name: str, data_path: str, use_sparse: bool, policy: str):
+def run_ingestion_pipeline(collection_name: str, data_path: str, use_sparse: bool, policy: str, workers: int = 1):
     print("--- Iniciando Pipeline de Ingesta de Datos ---")
+    settings = get_settings()
     
     # 1. Cargar documentos usando la fábrica de cargadores
     try:
@@ -39,45 +75,52 @@ def run_ingestion_pipeline(collection_name: str, data_path: str, use_sparse: boo
     print(f"Se encontraron {len(raw_documents)} documentos.")
 
     # 2. Configurar el DocumentStore
-    db_path = os.path.join(settings.VECTOR_STORE_PATH, collection_name)
+    # Cuantización escalar int8 de los vectores densos, hecha por Qdrant al crear la colección
+    quantization_config = qdrant_models.ScalarQuantization(
+        scalar=qdrant_models.ScalarQuantizationConfig(
+            type=qdrant_models.ScalarType.INT8, quantile=0.99, always_ram=True
+        )
+    ) if settings.INGEST_INT8_QUANTIZATION else None
     document_store = QdrantDocumentStore(
-        path=db_path, index=collection_name, 
+        # Servidor Qdrant si QDRANT_URL está definido; si no, base embebida en VECTOR_STORE_PATH
+        **qdrant_connection_kwargs(collection_name), index=collection_name,
         # The embedding dimension is now conditional
         embedding_dim=1536 if settings.EMBEDDING_PROVIDER == 'openai' else settings.EMBEDDING_DIM,
-        use_sparse_embeddings=use_sparse, sparse_idf=True
+        use_sparse_embeddings=use_sparse, sparse_idf=True,
+        # Upserts en lotes grandes sin esperar a que Qdrant termine de indexar cada uno
+        write_batch_size=settings.INGEST_WRITE_BATCH_SIZE, wait_result_from_api=False,
+        quantization_config=quantization_config
     )
     write_policy = DuplicatePolicy[policy.upper()]
 
-    # 3. Construir y ejecutar el pipeline de ingesta
-    ingestion_pipeline = Pipeline()
-    ingestion_pipeline.add_component("cleaner", DocumentCleaner())
-    ingestion_pipeline.add_component("splitter", DocumentSplitter(split_by="word", split_length=200, split_overlap=20))
-    
-    # Get the dense embedder from our factory
-    dense_embedder = get_document_embedder()
+    # 3. Pre-procesar (limpieza, división y, en modo híbrido, embeddings dispersos)
+    preprocessing_pipeline = Pipeline()
+    preprocessing_pipeline.add_component("cleaner", DocumentCleaner())
+    preprocessing_pipeline.add_component("splitter", DocumentSplitter(split_by="word", split_length=200, split_overlap=20))
+    preprocessing_pipeline.connect("cleaner.documents", "splitter.documents")
+    last_component = "splitter"
 
     if use_sparse:
         print("Modo Híbrido: Construyendo pipeline de ingesta híbrida.")
-        sparse_embedder = FastembedSparseDocumentEmbedder(model=settings.SPARSE_EMBEDDING_MODEL)
-        ingestion_pipeline.add_component("sparse_embedder", sparse_embedder)
-        ingestion_pipeline.add_component("dense_embedder", dense_embedder)
-        ingestion_pipeline.add_component("writer", DocumentWriter(document_store, policy=write_policy))
-
-        ingestion_pipeline.connect("cleaner.documents", "splitter.documents")
-        ingestion_pipeline.connect("splitter.documents", "sparse_embedder.documents")
-        ingestion_pipeline.connect("sparse_embedder.documents", "dense_embedder.documents")
-        ingestion_pipeline.connect("dense_embedder.documents", "writer.documents")
+        sparse_embedder = FastembedSparseDocumentEmbedder(
+            model=settings.SPARSE_EMBEDDING_MODEL, batch_size=settings.INGEST_BATCH_SIZE
+        )
+        preprocessing_pipeline.add_component("sparse_embedder", sparse_embedder)
+        preprocessing_pipeline.connect("splitter.documents", "sparse_embedder.documents")
+        last_component = "sparse_embedder"
     else:
         print("Modo Denso: Construyendo pipeline de ingesta densa.")
-        ingestion_pipeline.add_component("dense_embedder", dense_embedder)
-        ingestion_pipeline.add_component("writer", DocumentWriter(document_store, policy=write_policy))
 
-        ingestion_pipeline.connect("cleaner.documents", "splitter.documents")
-        ingestion_pipeline.connect("splitter.documents", "dense_embedder.documents")
-        ingestion_pipeline.connect("dense_embedder.documents", "writer.documents")
+    print("Ejecutando pre-procesamiento...")
+    result = preprocessing_pipeline.run({"cleaner": {"documents": raw_documents}})
+    documents = result[last_component]["documents"]
+
+    # 4. Embeddings densos (el paso más costoso), en paralelo si se pidieron varios workers
+    documents = embed_documents(documents, workers)
 
-    print(f"Ejecutando pre-procesamiento e indexación con política: '{policy.upper()}'...")
-    ingestion_pipeline.run({"cleaner": {"documents": raw_documents}})
+    # 5. Escribir en el DocumentStore
+    print(f"Indexando {len(documents)} fragmentos con política: '{policy.upper()}'...")
+    DocumentWriter(document_store, policy=write_policy).run(documents=documents)
 
     print(f"\n✅ Ingesta completada. La base de conocimiento '{collection_name}' está lista.")
 
@@ -93,9 +136,16 @@ if __name__ == "__main__":
         choices=["overwrite", "skip"],
         help="Política de escritura: 'overwrite' para reemplazar documentos existentes, 'skip' para ignorarlos."
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=get_settings().INGEST_WORKERS,
+        help="Número de procesos para calcular los embeddings densos (1 = sin paralelismo)."
+    )
 
     args = parser.parse_args()
-    run_ingestion_pipeline(args.collection_name, args.data_path, args.hybrid, args.policy)
+    configure_torch_threads()
+    run_ingestion_pipeline(args.collection_name, args.data_path, args.hybrid, args.policy, args.workers)
 
 
 
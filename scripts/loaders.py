@@ -1,8 +1,8 @@
 from abc import ABC, abstractmethod
 from typing import List
 import os
-import json
-import pandas as pd
+import orjson
+import polars as pl
 from haystack.dataclasses import Document
 
 class BaseLoader(ABC):
@@ -21,40 +21,47 @@ class ScraperJSONLLoader(BaseLoader):
             return []
 
         docs = []
-        with open(jsonl_path, 'r', encoding='utf-8') as f:
+        with open(jsonl_path, 'rb') as f:
             for line in f:
                 try:
-                    item = json.loads(line)
+                    item = orjson.loads(line)
                     metadata = {
                         "url": item.get("url", ""), "title": item.get("title", ""),
                         "timestamp": item.get("timestamp", ""), "content_hash": item.get("content_hash", "")
                     }
                     docs.append(Document(content=item.get("content", ""), meta=metadata))
-                except (json.JSONDecodeError, KeyError) as e:
+                except (orjson.JSONDecodeError, KeyError) as e:
                     print(f"Warning: Omitiendo línea en .jsonl por error: {e}")
         return docs
 
 class CsvQALoader(BaseLoader):
     """Carga documentos desde un archivo CSV de tipo Pregunta/Respuesta."""
+    COLUMNS = ['question', 'answer', 'title', 'url', 'source']
+
     def load(self, path: str) -> List[Document]:
         try:
-            df = pd.read_csv(path)
+            # Leer solo la cabecera para cargar únicamente las columnas conocidas
+            header = pl.read_csv(path, n_rows=0).columns
         except FileNotFoundError:
             print(f"Error: No se encontró el archivo CSV en {path}")
             return []
 
         docs = []
         required_cols = ['answer', 'question']
-        if not all(col in df.columns for col in required_cols):
+        if not all(col in header for col in required_cols):
             print(f"Error: El CSV debe tener las columnas 'answer' y 'question'.")
             return []
 
-        for _, row in df.iterrows():
-            content = row.get('answer', '')
+        # Todas las columnas como texto; iter_rows devuelve dicts planos (sin Series por fila)
+        columns = [col for col in self.COLUMNS if col in header]
+        df = pl.read_csv(path, columns=columns, infer_schema_length=0)
+
+        for row in df.iter_rows(named=True):
+            content = row.get('answer')
             if isinstance(content, str) and content.strip():
                 metadata = {
-                    'question': row.get('question', ''), 'title': row.get('title', ''),
-                    'url': row.get('url', ''), 'source': row.get('source', '')
+                    'question': row.get('question') or '', 'title': row.get('title') or '',
+                    'url': row.get('url') or '', 'source': row.get('source') or ''
                 }
                 docs.append(Document(content=content, meta=metadata))
         return docs
@@ -1,15 +1,22 @@
 
 import asyncio
+from functools import lru_cache
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any
 
 # Import the new factory function and data models
-from src.core.strategies import get_strategy
-from src.core.strategies import RAGInput
+from src.core.strategies import get_strategy, get_query_pool
+from src.core.strategies import BaseRAGStrategy, RAGInput
 
 router = APIRouter()
 
+@lru_cache(maxsize=32)
+def _cached_strategy(collection_name: str, strategy: str) -> BaseRAGStrategy:
+    """Returns a strategy instance reused across requests for the same collection/strategy."""
+    return get_strategy(collection_name, strategy)
+
 # --- Pydantic Models for Request and Response ---
 
 class QueryRequest(BaseModel):
@@ -17,6 +24,7 @@ class QueryRequest(BaseModel):
     collection_name: str
     strategy: str = "naive"  # Can be 'naive' or 'hybrid'
     top_k: int = 5
+    return_documents: bool = True  # Set to False to get only the answer
 
 class DocumentResponse(BaseModel):
     content: str
@@ -36,25 +44,31 @@ async def ask_question(request: QueryRequest):
     - **collection_name**: The knowledge base to query against.
     - **strategy**: The RAG pipeline to use ('naive' or 'hybrid').
     - **top_k**: The number of documents to retrieve and/or rank.
+    - **return_documents**: Whether to include the supporting documents in the response.
     """
     try:
-        # 1. Get the appropriate strategy instance from the factory
-        strategy_instance = get_strategy(request.collection_name, request.strategy)
-        
-        # 2. Prepare the input for the strategy
-        rag_input = RAGInput(question=request.question, top_k=request.top_k)
+        # 1. Prepare the input for the strategy
+        rag_input = RAGInput(
+            question=request.question, top_k=request.top_k, return_documents=request.return_documents
+        )
 
-        # 3. Run the strategy in a separate thread to avoid blocking the event loop
-        result = await asyncio.to_thread(strategy_instance.run, rag_input)
+        # 2. Resolve the cached strategy inside the query pool, so that a cold
+        #    pipeline build never blocks the event loop, and run it asynchronously
+        loop = asyncio.get_running_loop()
+        rag_strategy = await loop.run_in_executor(
+            get_query_pool(), _cached_strategy, request.collection_name, request.strategy
+        )
+        result = await rag_strategy.arun(rag_input)
 
-        # 4. Format the response
+        # 3. Format the response
         response_docs = []
         for doc in result.documents:
-            # The to_dict() method flattens the 'meta' dictionary.
-            # We need to reconstruct it for the response model.
-            content = doc.pop('content', '')
+            # Documents come flattened ({id, content, score, **meta}).
+            # We need to reconstruct it for the response model without mutating
+            # the document, which may be shared with the result cache.
+            content = doc.get('content', '')
             # The rest of the items in the dictionary are the metadata
-            meta = doc
+            meta = {key: value for key, value in doc.items() if key != 'content'}
             response_docs.append(DocumentResponse(content=content, meta=meta))
 
         return QueryResponse(answer=result.answer, documents=response_docs)
@@ -68,3 +82,37 @@ async def ask_question(request: QueryRequest):
         # Log the full error for debugging
         print(f"An unexpected error occurred: {e}")
         raise HTTPException(status_code=500, detail="An internal error occurred while processing the request.")
+
+@router.post("/query/stream")
+async def stream_answer(request: QueryRequest):
+    """
+    Same as /query, but streams the answer as plain text while the LLM generates it.
+    Retrieved documents are not included.
+    """
+    try:
+        # The stream only carries the answer, so the documents are never collected
+        rag_input = RAGInput(question=request.question, top_k=request.top_k, return_documents=False)
+        # Resolve the strategy before streaming starts, so errors still map to HTTP status codes
+        loop = asyncio.get_running_loop()
+        rag_strategy = await loop.run_in_executor(
+            get_query_pool(), _cached_strategy, request.collection_name, request.strategy
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Knowledge base '{request.collection_name}' not found. Please ensure it has been created.")
+    except ValueError as e:
+        # This will catch unsupported strategy names from our factory
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        # Log the full error for debugging
+        print(f"An unexpected error occurred: {e}")
+        raise HTTPException(status_code=500, detail="An internal error occurred while processing the request.")
+
+    async def tokens() -> AsyncIterator[str]:
+        try:
+            async for token in rag_strategy.astream(rag_input):
+                yield token
+        except Exception as e:
+            # The status code has already been sent; log and end the stream
+            print(f"An unexpected error occurred while streaming: {e}")
+
+    return StreamingResponse(tokens(), media_type="text/plain; charset=utf-8")
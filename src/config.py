@@ -1,5 +1,7 @@
 
 import os
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from pydantic_settings import BaseSettings
 from pydantic import SecretStr
 
@@ -11,7 +13,8 @@ class Settings(BaseSettings):
     # --- Provider Configuration ---
     # Use 'ollama' for local models, 'openai' for OpenAI API
     LLM_PROVIDER: str = "ollama"
-    # Use 'local' for SentenceTransformers, 'openai' for OpenAI API
+    # Use 'local' for SentenceTransformers, 'fastembed' for FastEmbed (ONNX Runtime),
+    # 'onnx' for an Optimum-optimized ONNX Runtime export, 'openai' for OpenAI API
     EMBEDDING_PROVIDER: str = "local"
 
     # --- OpenAI Configuration ---
@@ -24,16 +27,77 @@ class Settings(BaseSettings):
     LOCAL_EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
     SPARSE_EMBEDDING_MODEL: str = "naver/splade-v2-distil"
     RANKER_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    # Use 'torch' for the PyTorch weights, 'onnx' to run RANKER_ONNX_FILE with ONNX Runtime
+    RANKER_BACKEND: str = "torch"
+    # int8 (VNNI) export shipped in the cross-encoder repo; only used with RANKER_BACKEND='onnx'
+    RANKER_ONNX_FILE: str = "onnx/model_qint8_avx512_vnni.onnx"
+
+    # --- FastEmbed Model Configuration ---
+    # ONNX build of all-MiniLM-L6-v2 (same 384-dim space as LOCAL_EMBEDDING_MODEL)
+    FASTEMBED_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # int8 (VNNI) export from the sentence-transformers repo, loaded by FastEmbed instead of
+    # its default fp32 export. Set to '' to use the fp32 model. It is only fast on CPUs with
+    # AVX-512 VNNI, and its vectors differ slightly from fp32 ones (re-ingest when switching)
+    FASTEMBED_ONNX_FILE: str = "onnx/model_qint8_avx512_vnni.onnx"
     EMBEDDING_DIM: int = 384 # For all-MiniLM-L6-v2
 
+    # --- Optimum/ONNX Model Configuration (EMBEDDING_PROVIDER='onnx') ---
+    ONNX_EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # Dynamic int8 quantization target: 'avx512_vnni', 'avx512', 'avx2', 'arm64', or '' to disable
+    ONNX_QUANTIZATION: str = "avx512_vnni"
+    # Where the optimized/quantized ONNX exports are written
+    ONNX_WORKING_DIR: str = os.path.abspath(
+        os.path.join(os.path.dirname(__file__), '../../onnx_models')
+    )
+
+    # --- PyTorch Threading ---
+    # Intra-op threads for local (torch) embedders and the ranker; unset = all cores.
+    # With EMBED_BATCH_MAX > 1 or a large QUERY_CONCURRENCY, several forward passes run
+    # at once, so lower this to avoid oversubscribing the CPU.
+    TORCH_NUM_THREADS: Optional[int] = None
+
     # --- Vector Store Configuration ---
     # It's important that this path is absolute for consistency.
     VECTOR_STORE_PATH: str = os.path.abspath(
         os.path.join(os.path.dirname(__file__), '../../vector_stores')
     )
 
+    # --- Qdrant Server Configuration ---
+    # When set, collections live on this Qdrant server (gRPC preferred) instead of
+    # the embedded per-collection databases under VECTOR_STORE_PATH
+    QDRANT_URL: Optional[str] = None
+    QDRANT_API_KEY: Optional[SecretStr] = None
+
+    # --- Ingestion Configuration ---
+    # Documents per embedder forward pass / API call
+    INGEST_BATCH_SIZE: int = 64
+    # Points per Qdrant upsert request
+    INGEST_WRITE_BATCH_SIZE: int = 256
+    # Processes used to compute dense embeddings (each one loads its own model)
+    INGEST_WORKERS: int = 1
+    # Create new collections with Qdrant int8 scalar quantization of the dense vectors
+    # (~4x less vector memory; originals stay on disk for rescoring). Server mode only:
+    # the embedded/local Qdrant ignores it.
+    INGEST_INT8_QUANTIZATION: bool = False
+
     # --- API Configuration ---
     API_V1_STR: str = "/api/v1"
+    # Max number of RAG queries executed at the same time (size of the query thread pool)
+    QUERY_CONCURRENCY: int = 8
+    # Max number of LLM calls in flight at the same time, to avoid upstream throttling
+    MAX_CONCURRENT_LLM_CALLS: int = 4
+    # Dynamic batching of concurrent query embeddings: up to EMBED_BATCH_MAX texts
+    # gathered within EMBED_BATCH_WINDOW_MS per forward pass. 1 disables batching
+    EMBED_BATCH_MAX: int = 1
+    EMBED_BATCH_WINDOW_MS: float = 5.0
+    # (collection, strategy) pipelines built at startup, as JSON,
+    # e.g. PREWARM_PIPELINES='[["docs", "hybrid"]]'
+    PREWARM_PIPELINES: List[Tuple[str, str]] = []
+    # Answers cached per (collection, strategy, question, top_k); size 0 disables the cache
+    PIPELINE_CACHE_SIZE: int = 1024
+    PIPELINE_CACHE_TTL_S: int = 300
+    # Query embeddings kept in memory (float16), shared by all pipelines; 0 disables it
+    EMBEDDING_CACHE_SIZE: int = 10000
 
     class Config:
         # This tells Pydantic to load variables from a .env file.
@@ -41,5 +105,12 @@ class Settings(BaseSettings):
         # env_file_encoding = 'utf-8' # Uncomment if you have encoding issues
         case_sensitive = True
 
-# Create a single, importable instance of the settings
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Returns the application settings, parsing the environment and .env only once.
+
+    Settings are built on first use rather than at import time. Tests can
+    override the environment and call get_settings.cache_clear() to reload.
+    """
+    return Settings()
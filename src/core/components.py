@@ -0,0 +1,250 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from haystack import Document, component
+from haystack.dataclasses import SparseEmbedding, StreamingChunk
+
+# Haystack refuses to add the same component instance to more than one Pipeline.
+# These thin wrappers are created per pipeline and delegate to a single, shared
+# instance of the underlying model, so all pipelines use one copy of its weights.
+
+def _warm_up(shared: Any) -> None:
+    """Warms up the shared component if it supports it (a no-op once loaded)."""
+    if hasattr(shared, "warm_up"):
+        shared.warm_up()
+
+
+class BatchingTextEmbedder:
+    """
+    Coalesces concurrent single-text embedding requests into batches.
+
+    Query threads enqueue their text and wait; a background thread collects up to
+    `max_batch` texts (or whatever arrives within `window_s` of the first one) and
+    embeds them in one call to a document embedder's batch API. It exposes the same
+    run(text) interface as a text embedder, so it can be wrapped by SharedTextEmbedder.
+    """
+
+    def __init__(self, document_embedder: Any, max_batch: int, window_s: float):
+        self.document_embedder = document_embedder
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def warm_up(self):
+        _warm_up(self.document_embedder)
+
+    def run(self, text: str) -> Dict[str, List[float]]:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("BatchingTextEmbedder has been closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="embed-batcher", daemon=True)
+                self._thread.start()
+            self._queue.put((text, future))
+        return {"embedding": future.result()}
+
+    def close(self) -> None:
+        """Stops the background thread once the pending requests are embedded."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._embed_batch(batch)
+            if stop:
+                return
+
+    def _embed_batch(self, batch: List[tuple]) -> None:
+        try:
+            documents = [Document(content=text) for text, _ in batch]
+            documents = self.document_embedder.run(documents=documents)["documents"]
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), document in zip(batch, documents):
+            future.set_result(document.embedding)
+
+
+@component
+class SmartBatchDocumentEmbedder:
+    """
+    Sorts documents by length before handing them to a document embedder, so each
+    of its batches holds texts of similar length and is padded as little as possible.
+    Embedded documents are returned in the original input order.
+    """
+
+    def __init__(self, embedder: Any):
+        self.embedder = embedder
+
+    def warm_up(self):
+        _warm_up(self.embedder)
+
+    @component.output_types(documents=List[Document])
+    def run(self, documents: List[Document]):
+        order = sorted(range(len(documents)), key=lambda i: len(documents[i].content or ""), reverse=True)
+        embedded = self.embedder.run(documents=[documents[i] for i in order])["documents"]
+        result: List[Optional[Document]] = [None] * len(documents)
+        for position, document in zip(order, embedded):
+            result[position] = document
+        return {"documents": result}
+
+
+@component
+class SharedTextEmbedder:
+    """Pipeline-local handle on a shared dense text embedder."""
+
+    def __init__(self, embedder: Any):
+        self.embedder = embedder
+
+    def warm_up(self):
+        _warm_up(self.embedder)
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        return {"embedding": self.embedder.run(text=text)["embedding"]}
+
+
+@component
+class CachedTextEmbedder:
+    """
+    Dense text embedder that looks the text up in an EmbeddingCache before
+    calling the wrapped embedder. Embeddings are deterministic, so unlike LLM
+    answers they can be reused for as long as they stay in the cache.
+    """
+
+    def __init__(self, embedder: Any, cache: Any, provider: str, model: str):
+        self.embedder = embedder
+        self.cache = cache
+        self.provider = provider
+        self.model = model
+
+    def warm_up(self):
+        _warm_up(self.embedder)
+
+    @component.output_types(embedding=List[float])
+    def run(self, text: str):
+        key = (self.provider, self.model, text)
+        embedding = self.cache.get(key)
+        if embedding is None:
+            # Return the stored, rounded vector so first and repeated queries match exactly
+            embedding = self.cache.put(key, self.embedder.run(text=text)["embedding"])
+        return {"embedding": embedding}
+
+
+@component
+class SharedSparseTextEmbedder:
+    """Pipeline-local handle on a shared sparse text embedder."""
+
+    def __init__(self, embedder: Any):
+        self.embedder = embedder
+
+    def warm_up(self):
+        _warm_up(self.embedder)
+
+    @component.output_types(sparse_embedding=SparseEmbedding)
+    def run(self, text: str):
+        return {"sparse_embedding": self.embedder.run(text=text)["sparse_embedding"]}
+
+
+@component
+class ParallelEmbedders:
+    """
+    Computes the dense and sparse embeddings of a query concurrently.
+
+    The two embedders don't depend on each other, but a Pipeline runs them one
+    after the other. Here the sparse one runs in a background thread while the
+    dense one runs in the caller's thread, so latency is the slower of the two.
+    """
+
+    def __init__(self, dense: Any, sparse: Any, max_workers: int = 4):
+        self.dense = dense
+        self.sparse = sparse
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sparse-embed")
+
+    def warm_up(self):
+        _warm_up(self.dense)
+        _warm_up(self.sparse)
+
+    @component.output_types(embedding=List[float], sparse_embedding=SparseEmbedding)
+    def run(self, text: str):
+        sparse_future = self._executor.submit(self.sparse.run, text=text)
+        embedding = self.dense.run(text=text)["embedding"]
+        return {"embedding": embedding, "sparse_embedding": sparse_future.result()["sparse_embedding"]}
+
+
+@component
+class SharedRanker:
+    """Pipeline-local handle on a shared ranker."""
+
+    def __init__(self, ranker: Any):
+        self.ranker = ranker
+
+    def warm_up(self):
+        _warm_up(self.ranker)
+
+    @component.output_types(documents=List[Document])
+    def run(self, query: str, documents: List[Document], top_k: Optional[int] = None):
+        return {"documents": self.ranker.run(query=query, documents=documents, top_k=top_k)["documents"]}
+
+
+@component
+class SharedGenerator:
+    """
+    Pipeline-local handle on a shared LLM generator. An optional semaphore,
+    shared by all pipelines, caps the number of calls in flight.
+    """
+
+    def __init__(self, generator: Any, semaphore: Optional[threading.Semaphore] = None):
+        self.generator = generator
+        self.semaphore = semaphore
+
+    def warm_up(self):
+        _warm_up(self.generator)
+
+    @component.output_types(replies=List[str], meta=List[Dict[str, Any]])
+    def run(
+        self,
+        prompt: str,
+        generation_kwargs: Optional[Dict[str, Any]] = None,
+        streaming_callback: Optional[Callable[[StreamingChunk], None]] = None,
+    ):
+        kwargs: Dict[str, Any] = {"prompt": prompt, "generation_kwargs": generation_kwargs}
+        if streaming_callback is not None:
+            # Per-call callback, so pipelines sharing the generator can stream independently
+            kwargs["streaming_callback"] = streaming_callback
+        if self.semaphore is None:
+            result = self.generator.run(**kwargs)
+        else:
+            with self.semaphore:
+                result = self.generator.run(**kwargs)
+        return {"replies": result["replies"], "meta": result.get("meta", [])}
@@ -1,9 +1,17 @@
-from typing import Dict
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
 from haystack import Pipeline
 
 # Import the pipeline building functions
 from .pipelines import build_naive_rag_pipeline, build_hybrid_rag_pipeline
 
+_BUILDERS = {
+    "naive": build_naive_rag_pipeline,
+    "hybrid": build_hybrid_rag_pipeline,
+}
+
 class PipelineManager:
     """
     Manages the lifecycle of Haystack pipelines.
@@ -12,7 +20,13 @@ class PipelineManager:
     for reuse across multiple API requests. This is critical for performance as
     it avoids reloading heavy models on every call.
     """
-    _pipelines: Dict[str, Pipeline] = {}
+    _pipelines: Dict[Tuple[str, str], Pipeline] = {}
+    # Guards the per-key locks and their waiter counts; held only briefly.
+    _global_lock = threading.Lock()
+    # One [lock, waiters] entry per cache key so only one build runs per
+    # (collection, strategy). Entries are dropped once no thread needs them,
+    # so unknown collection names sent by clients don't accumulate here.
+    _key_locks: Dict[Tuple[str, str], List] = {}
 
     @classmethod
     def get_pipeline(cls, collection_name: str, strategy: str) -> Pipeline:
@@ -27,22 +41,64 @@ class PipelineManager:
         Returns:
             A ready-to-use Haystack Pipeline instance.
         """
-        cache_key = f"{collection_name}_{strategy}"
-        
-        if cache_key not in cls._pipelines:
-            print(f"INFO: Pipeline for '{cache_key}' not found in cache. Building...")
-            
-            if strategy == "naive":
-                pipeline = build_naive_rag_pipeline(collection_name)
-            elif strategy == "hybrid":
-                pipeline = build_hybrid_rag_pipeline(collection_name)
-            else:
-                raise ValueError(f"Unsupported RAG strategy: '{strategy}' ")
-            
-            cls._pipelines[cache_key] = pipeline
-            print(f"INFO: Pipeline for '{cache_key}' built and cached successfully.")
-        
-        return cls._pipelines[cache_key]
+        cache_key = (collection_name, strategy)
+
+        # Fast path: no locking once the pipeline is cached.
+        pipeline = cls._pipelines.get(cache_key)
+        if pipeline is not None:
+            return pipeline
+
+        builder = _BUILDERS.get(strategy)
+        if builder is None:
+            raise ValueError(f"Unsupported RAG strategy: '{strategy}' ")
+
+        with cls._global_lock:
+            entry = cls._key_locks.get(cache_key)
+            if entry is None:
+                entry = cls._key_locks[cache_key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        try:
+            with entry[0]:
+                # Another thread may have built it while we were waiting.
+                pipeline = cls._pipelines.get(cache_key)
+                if pipeline is not None:
+                    return pipeline
+
+                print(f"INFO: Pipeline for '{collection_name}/{strategy}' not found in cache. Building...")
+                pipeline = builder(collection_name)
+                cls._pipelines[cache_key] = pipeline
+                print(f"INFO: Pipeline for '{collection_name}/{strategy}' built and cached successfully.")
+        finally:
+            # The last thread out removes the entry, whether the build succeeded or failed.
+            with cls._global_lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del cls._key_locks[cache_key]
+
+        return pipeline
+
+    @classmethod
+    def prewarm(cls, pairs: Iterable[Tuple[str, str]]) -> None:
+        """
+        Builds the given (collection_name, strategy) pipelines in parallel threads,
+        so the first request to each one doesn't pay the model loading cost.
+
+        Failures are logged and skipped; the pipeline will be built on first use instead.
+        """
+        pairs = list(dict.fromkeys(tuple(pair) for pair in pairs))
+        if not pairs:
+            return
+
+        print(f"INFO: Prewarming {len(pairs)} pipeline(s)...")
+        with ThreadPoolExecutor(max_workers=min(len(pairs), os.cpu_count() or 1),
+                                thread_name_prefix="pipeline-prewarm") as executor:
+            futures = {executor.submit(cls.get_pipeline, *pair): pair for pair in pairs}
+            for future, (collection_name, strategy) in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"WARNING: Could not prewarm pipeline '{collection_name}/{strategy}': {e}")
 
 # A single, globally accessible instance of the manager.
 # The API will interact with this instance.
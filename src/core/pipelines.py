@@ -1,76 +1,328 @@
 
+import os
+import sys
+import threading
+from functools import lru_cache
+from typing import List
+
 from haystack import Pipeline
 from haystack.components.builders import PromptBuilder
-from haystack.components.embedders import SentenceTransformersTextEmbedder, SentenceTransformersDocumentEmbedder
-from haystack.components.rankers import SentenceTransformersSimilarityRanker
-from haystack_integrations.components.embedders.fastembed import FastembedSparseTextEmbedder
-from haystack_integrations.components.generators.ollama import OllamaGenerator
-from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever, QdrantHybridRetriever
 from pathlib import Path
 
-# Import OpenAI components
-from haystack.components.generators import OpenAIGenerator
-from haystack.components.embedders import OpenAITextEmbedder, OpenAIDocumentEmbedder
+# Provider-specific components (SentenceTransformers, FastEmbed, Ollama, OpenAI, Qdrant)
+# are imported inside the factories below, so only the backends actually configured
+# pay their import time and memory.
 
 # Import Haystack's secret management
 from haystack.utils import Secret
 
-from src.config import settings
+from src.config import get_settings
+from src.core.components import (
+    BatchingTextEmbedder, CachedTextEmbedder, ParallelEmbedders, SharedGenerator, SharedRanker,
+    SharedSparseTextEmbedder, SharedTextEmbedder, SmartBatchDocumentEmbedder
+)
 from src.services.document_store import get_document_store
+from src.services.embedding_cache import get_embedding_cache
+
+# Resolved once at import; the templates themselves are read on first use.
+_PROMPTS_DIR = Path(__file__).resolve().parent.parent.parent / "prompts"
+
+# --- Runtime Configuration ---
+
+def _torch_num_threads() -> int:
+    return get_settings().TORCH_NUM_THREADS or os.cpu_count() or 4
+
+def configure_torch_threads() -> None:
+    """
+    Sets OMP_NUM_THREADS/MKL_NUM_THREADS to TORCH_NUM_THREADS (default: all cores).
+    Call it at startup: it doesn't import torch, so deployments that never load a
+    torch model don't pay for it. Torch itself is configured by _apply_torch_threads()
+    when the first torch model is built (or right away if it is already imported).
+    """
+    num_threads = _torch_num_threads()
+    # Only effective if torch (and its OpenMP/MKL runtimes) hasn't been imported yet
+    if "torch" not in sys.modules:
+        os.environ.setdefault("OMP_NUM_THREADS", str(num_threads))
+        os.environ.setdefault("MKL_NUM_THREADS", str(num_threads))
+    else:
+        _apply_torch_threads()
+
+@lru_cache(maxsize=1)
+def _apply_torch_threads() -> None:
+    """
+    Sets PyTorch's intra-op threads to TORCH_NUM_THREADS and inter-op threads to half
+    the cores. Runs once, from the builders of torch-backed models.
+    """
+    import torch
+
+    num_threads = _torch_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(max(1, (os.cpu_count() or 4) // 2))
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work has started
+        pass
+    print(f"PyTorch threads: {num_threads} intra-op, {torch.get_num_interop_threads()} inter-op")
 
 # --- Component Factories ---
+# The heavy models/clients are built once per configuration by the memoized
+# _build_* functions and shared by every pipeline through the Shared* wrappers.
+# _BUILD_LOCK keeps concurrent pipeline builds from loading the same model twice.
 
-def get_llm():
-    """Factory to get the appropriate LLM based on settings."""
-    provider = settings.LLM_PROVIDER.lower()
+_BUILD_LOCK = threading.RLock()
+
+@lru_cache(maxsize=None)
+def _build_llm(provider: str, model: str):
     if provider == "openai":
-        print(f"Using LLM provider: OpenAI (model: {settings.OPENAI_LLM_MODEL})")
+        from haystack.components.generators import OpenAIGenerator
+        print(f"Using LLM provider: OpenAI (model: {model})")
         # Use Secret.from_env_var to securely pass the API key
-        return OpenAIGenerator(api_key=Secret.from_env_var("OPENAI_API_KEY"), model=settings.OPENAI_LLM_MODEL)
+        return OpenAIGenerator(api_key=Secret.from_env_var("OPENAI_API_KEY"), model=model)
     elif provider == "ollama":
-        print(f"Using LLM provider: Ollama (model: {settings.OLLAMA_LLM_MODEL})")
-        return OllamaGenerator(model=settings.OLLAMA_LLM_MODEL)
+        from haystack_integrations.components.generators.ollama import OllamaGenerator
+        print(f"Using LLM provider: Ollama (model: {model})")
+        return OllamaGenerator(model=model)
     else:
-        raise ValueError(f"Unsupported LLM provider: {settings.LLM_PROVIDER}")
+        raise ValueError(f"Unsupported LLM provider: {provider}")
 
-def get_text_embedder():
-    """Factory to get the appropriate text embedder for queries."""
-    provider = settings.EMBEDDING_PROVIDER.lower()
+def _optimum_kwargs(model: str) -> dict:
+    """Export options for the Optimum embedders: O3 graph optimization plus dynamic int8 quantization."""
+    from haystack_integrations.components.embedders.optimum import (
+        OptimumEmbedderOptimizationConfig, OptimumEmbedderOptimizationMode,
+        OptimumEmbedderQuantizationConfig, OptimumEmbedderQuantizationMode
+    )
+
+    settings = get_settings()
+    quantization = settings.ONNX_QUANTIZATION.lower()
+    return {
+        "model": model,
+        "onnx_execution_provider": "CPUExecutionProvider",
+        "working_dir": settings.ONNX_WORKING_DIR,
+        "optimizer_settings": OptimumEmbedderOptimizationConfig(
+            mode=OptimumEmbedderOptimizationMode.O3, for_gpu=False
+        ),
+        "quantizer_settings": OptimumEmbedderQuantizationConfig(
+            mode=OptimumEmbedderQuantizationMode.from_str(quantization)
+        ) if quantization else None,
+    }
+
+@lru_cache(maxsize=None)
+def _fastembed_model(model: str, onnx_file: str) -> str:
+    """
+    Returns the FastEmbed model name to load. With an ONNX file (e.g. the int8 export),
+    registers the model's Hub repo as a FastEmbed custom model using that file.
+    """
+    if not onnx_file:
+        return model
+
+    from fastembed import TextEmbedding
+    from fastembed.common.model_description import ModelSource, PoolingType
+
+    # Custom models can't reuse the name of a built-in one
+    custom_name = f"{model}-{Path(onnx_file).stem}"
+    TextEmbedding.add_custom_model(
+        model=custom_name, pooling=PoolingType.MEAN, normalization=True,
+        sources=ModelSource(hf=model), dim=get_settings().EMBEDDING_DIM, model_file=onnx_file
+    )
+    return custom_name
+
+@lru_cache(maxsize=None)
+def _build_text_embedder(provider: str, model: str):
+    # Query embedders encode one short text per call, so the per-call tqdm bar is pure overhead.
     if provider == "openai":
-        print(f"Using Text Embedder provider: OpenAI (model: {settings.OPENAI_EMBEDDING_MODEL})")
-        return OpenAITextEmbedder(api_key=Secret.from_env_var("OPENAI_API_KEY"), model=settings.OPENAI_EMBEDDING_MODEL)
+        from haystack.components.embedders import OpenAITextEmbedder
+        print(f"Using Text Embedder provider: OpenAI (model: {model})")
+        return OpenAITextEmbedder(api_key=Secret.from_env_var("OPENAI_API_KEY"), model=model)
     elif provider == "local":
-        print(f"Using Text Embedder provider: Local (model: {settings.LOCAL_EMBEDDING_MODEL})")
-        return SentenceTransformersTextEmbedder(model=settings.LOCAL_EMBEDDING_MODEL)
+        _apply_torch_threads()
+        from haystack.components.embedders import SentenceTransformersTextEmbedder
+        print(f"Using Text Embedder provider: Local (model: {model})")
+        embedder = SentenceTransformersTextEmbedder(model=model, progress_bar=False)
+    elif provider == "fastembed":
+        from haystack_integrations.components.embedders.fastembed import FastembedTextEmbedder
+        print(f"Using Text Embedder provider: FastEmbed (model: {model})")
+        embedder = FastembedTextEmbedder(
+            model=_fastembed_model(model, get_settings().FASTEMBED_ONNX_FILE), progress_bar=False
+        )
+    elif provider == "onnx":
+        from haystack_integrations.components.embedders.optimum import OptimumTextEmbedder
+        print(f"Using Text Embedder provider: ONNX/Optimum (model: {model})")
+        embedder = OptimumTextEmbedder(**_optimum_kwargs(model))
     else:
-        raise ValueError(f"Unsupported Embedding provider: {settings.EMBEDDING_PROVIDER}")
+        raise ValueError(f"Unsupported Embedding provider: {provider}")
+    embedder.warm_up()
+    return embedder
 
-def get_document_embedder():
-    """Factory to get the appropriate document embedder for ingestion."""
-    provider = settings.EMBEDDING_PROVIDER.lower()
+@lru_cache(maxsize=None)
+def _build_document_embedder(provider: str, model: str, batch_size: int, progress_bar: bool = True):
     if provider == "openai":
-        print(f"Using Document Embedder provider: OpenAI (model: {settings.OPENAI_EMBEDDING_MODEL})")
-        return OpenAIDocumentEmbedder(api_key=Secret.from_env_var("OPENAI_API_KEY"), model=settings.OPENAI_EMBEDDING_MODEL)
+        from haystack.components.embedders import OpenAIDocumentEmbedder
+        print(f"Using Document Embedder provider: OpenAI (model: {model})")
+        return OpenAIDocumentEmbedder(
+            api_key=Secret.from_env_var("OPENAI_API_KEY"), model=model, batch_size=batch_size,
+            progress_bar=progress_bar
+        )
     elif provider == "local":
-        print(f"Using Document Embedder provider: Local (model: {settings.LOCAL_EMBEDDING_MODEL})")
-        return SentenceTransformersDocumentEmbedder(model=settings.LOCAL_EMBEDDING_MODEL)
+        _apply_torch_threads()
+        from haystack.components.embedders import SentenceTransformersDocumentEmbedder
+        print(f"Using Document Embedder provider: Local (model: {model})")
+        embedder = SentenceTransformersDocumentEmbedder(
+            model=model, batch_size=batch_size, progress_bar=progress_bar
+        )
+    elif provider == "fastembed":
+        from haystack_integrations.components.embedders.fastembed import FastembedDocumentEmbedder
+        print(f"Using Document Embedder provider: FastEmbed (model: {model})")
+        # FastEmbed pads each batch to its longest text; SentenceTransformers already
+        # length-sorts internally and OpenAI batches server-side.
+        embedder = SmartBatchDocumentEmbedder(
+            FastembedDocumentEmbedder(
+                model=_fastembed_model(model, get_settings().FASTEMBED_ONNX_FILE),
+                batch_size=batch_size, progress_bar=progress_bar
+            )
+        )
+    elif provider == "onnx":
+        from haystack_integrations.components.embedders.optimum import OptimumDocumentEmbedder
+        print(f"Using Document Embedder provider: ONNX/Optimum (model: {model})")
+        embedder = OptimumDocumentEmbedder(
+            **_optimum_kwargs(model), batch_size=batch_size, progress_bar=progress_bar
+        )
     else:
-        raise ValueError(f"Unsupported Embedding provider: {settings.EMBEDDING_PROVIDER}")
+        raise ValueError(f"Unsupported Embedding provider: {provider}")
+    embedder.warm_up()
+    return embedder
 
-# --- Prompt Template Loading (no changes) ---
+# Batchers started by _build_batching_embedder, stopped by close_batching_embedders()
+_batchers: List[BatchingTextEmbedder] = []
 
-def load_prompt_template(template_name: str = "expert_rag_template.txt") -> str:
-    """Loads a prompt template from the 'prompts' directory."""
-    base_dir = Path(__file__).resolve().parent.parent.parent
-    prompt_path = base_dir / "prompts" / template_name
+@lru_cache(maxsize=None)
+def _build_batching_embedder(provider: str, model: str, max_batch: int, window_ms: float):
+    print(f"Batching query embeddings (max {max_batch} per batch, {window_ms} ms window)")
+    batcher = BatchingTextEmbedder(
+        _build_document_embedder(provider, model, max_batch, progress_bar=False),
+        max_batch=max_batch, window_s=window_ms / 1000
+    )
+    _batchers.append(batcher)
+    return batcher
+
+def close_batching_embedders() -> None:
+    """Stops the background threads of the query embedding batchers."""
+    while _batchers:
+        _batchers.pop().close()
+    _build_batching_embedder.cache_clear()
+
+@lru_cache(maxsize=None)
+def _build_sparse_embedder(model: str):
+    from haystack_integrations.components.embedders.fastembed import FastembedSparseTextEmbedder
+
+    print(f"Using Sparse Embedder (model: {model})")
+    embedder = FastembedSparseTextEmbedder(model=model, progress_bar=False)
+    embedder.warm_up()
+    return embedder
+
+@lru_cache(maxsize=None)
+def _build_ranker(backend: str, model: str, onnx_file: str):
+    from haystack.components.rankers import SentenceTransformersSimilarityRanker
+
+    if backend == "onnx":
+        print(f"Using Ranker backend: ONNX (model: {model}, file: {onnx_file})")
+        ranker = SentenceTransformersSimilarityRanker(
+            model=model, backend="onnx", model_kwargs={"file_name": onnx_file}
+        )
+    elif backend == "torch":
+        import torch
+
+        _apply_torch_threads()
+
+        # Half precision only pays off on GPU; on CPU fp16/bf16 matmuls are slower than fp32
+        model_kwargs = None
+        if torch.cuda.is_available():
+            dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+            model_kwargs = {"torch_dtype": dtype}
+        print(f"Using Ranker backend: PyTorch (model: {model}, dtype: {model_kwargs['torch_dtype'] if model_kwargs else 'float32'})")
+        ranker = SentenceTransformersSimilarityRanker(model=model, model_kwargs=model_kwargs)
+    else:
+        raise ValueError(f"Unsupported Ranker backend: {backend}")
+    ranker.warm_up()
+    return ranker
+
+@lru_cache(maxsize=1)
+def _llm_semaphore() -> threading.BoundedSemaphore:
+    """Process-wide limit on concurrent LLM calls (MAX_CONCURRENT_LLM_CALLS)."""
+    return threading.BoundedSemaphore(get_settings().MAX_CONCURRENT_LLM_CALLS)
+
+def _embedding_model(provider: str) -> str:
+    """Returns the configured embedding model for the given provider."""
+    settings = get_settings()
+    return {
+        "openai": settings.OPENAI_EMBEDDING_MODEL,
+        "local": settings.LOCAL_EMBEDDING_MODEL,
+        "fastembed": settings.FASTEMBED_EMBEDDING_MODEL,
+        "onnx": settings.ONNX_EMBEDDING_MODEL,
+    }.get(provider, "")
+
+def get_llm() -> SharedGenerator:
+    """Factory to get the appropriate LLM based on settings."""
+    settings = get_settings()
+    provider = settings.LLM_PROVIDER.lower()
+    model = settings.OPENAI_LLM_MODEL if provider == "openai" else settings.OLLAMA_LLM_MODEL
+    with _BUILD_LOCK:
+        return SharedGenerator(_build_llm(provider, model), semaphore=_llm_semaphore())
+
+def get_text_embedder() -> SharedTextEmbedder:
+    """Factory to get the appropriate text embedder for queries."""
+    settings = get_settings()
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    with _BUILD_LOCK:
+        if settings.EMBED_BATCH_MAX > 1:
+            # Concurrent queries are embedded together through the document embedder's batch API
+            return SharedTextEmbedder(_build_batching_embedder(
+                provider, _embedding_model(provider), settings.EMBED_BATCH_MAX, settings.EMBED_BATCH_WINDOW_MS
+            ))
+        return SharedTextEmbedder(_build_text_embedder(provider, _embedding_model(provider)))
+
+def get_query_embedder():
+    """Text embedder for queries, backed by the shared embedding cache when it is enabled."""
+    embedder = get_text_embedder()
+    with _BUILD_LOCK:
+        # Under the lock, so concurrent prewarm builds can't each create their own cache
+        cache = get_embedding_cache()
+    if cache is None:
+        return embedder
+    provider = get_settings().EMBEDDING_PROVIDER.lower()
+    return CachedTextEmbedder(embedder, cache, provider, _embedding_model(provider))
+
+def get_document_embedder():
+    """Factory to get the appropriate document embedder for ingestion."""
+    settings = get_settings()
+    provider = settings.EMBEDDING_PROVIDER.lower()
+    with _BUILD_LOCK:
+        return _build_document_embedder(provider, _embedding_model(provider), settings.INGEST_BATCH_SIZE)
+
+def get_sparse_embedder() -> SharedSparseTextEmbedder:
+    """Factory to get the sparse (SPLADE) text embedder for hybrid queries."""
+    with _BUILD_LOCK:
+        return SharedSparseTextEmbedder(_build_sparse_embedder(get_settings().SPARSE_EMBEDDING_MODEL))
+
+def get_ranker() -> SharedRanker:
+    """Factory to get the cross-encoder ranker, optionally running the int8 ONNX export."""
+    settings = get_settings()
+    with _BUILD_LOCK:
+        return SharedRanker(
+            _build_ranker(settings.RANKER_BACKEND.lower(), settings.RANKER_MODEL, settings.RANKER_ONNX_FILE)
+        )
+
+# --- Prompt Template Loading ---
+
+@lru_cache(maxsize=4)
+def get_prompt_template(template_name: str = "expert_rag_template.txt") -> str:
+    """Loads a prompt template from the 'prompts' directory, reading it only once."""
+    prompt_path = _PROMPTS_DIR / template_name
     try:
         with open(prompt_path, "r", encoding="utf-8") as f:
             return f.read()
     except FileNotFoundError:
         raise FileNotFoundError(f"Prompt template not found at: {prompt_path}")
 
-prompt_template = load_prompt_template()
-
 # --- Pipeline Definitions ---
 
 def build_naive_rag_pipeline(collection_name: str) -> Pipeline:
@@ -78,11 +330,13 @@ def build_naive_rag_pipeline(collection_name: str) -> Pipeline:
     Builds and returns a simple RAG pipeline using a dense vector retriever.
     It now uses the component factories to select the LLM and Embedder.
     """
+    from haystack_integrations.components.retrievers.qdrant import QdrantEmbeddingRetriever
+
     document_store = get_document_store(collection_name, use_sparse=False)
     
-    text_embedder = get_text_embedder()
+    text_embedder = get_query_embedder()
     retriever = QdrantEmbeddingRetriever(document_store=document_store)
-    prompt_builder = PromptBuilder(template=prompt_template)
+    prompt_builder = PromptBuilder(template=get_prompt_template())
     llm = get_llm()
 
     rag_pipeline = Pipeline()
@@ -102,25 +356,29 @@ def build_hybrid_rag_pipeline(collection_name: str) -> Pipeline:
     Builds and returns a hybrid RAG pipeline with a re-ranker.
     It now uses the component factories.
     """
+    from haystack_integrations.components.retrievers.qdrant import QdrantHybridRetriever
+
+    settings = get_settings()
     document_store = get_document_store(collection_name, use_sparse=True)
 
-    sparse_embedder = FastembedSparseTextEmbedder(model=settings.SPARSE_EMBEDDING_MODEL)
-    dense_embedder = get_text_embedder()
+    # Dense and sparse query embeddings are computed concurrently by one component
+    embedders = ParallelEmbedders(
+        dense=get_query_embedder(), sparse=get_sparse_embedder(), max_workers=settings.QUERY_CONCURRENCY
+    )
     retriever = QdrantHybridRetriever(document_store=document_store)
-    ranker = SentenceTransformersSimilarityRanker(model=settings.RANKER_MODEL)
-    prompt_builder = PromptBuilder(template=prompt_template)
+    ranker = get_ranker()
+    prompt_builder = PromptBuilder(template=get_prompt_template())
     llm = get_llm()
 
     hybrid_pipeline = Pipeline()
-    hybrid_pipeline.add_component("sparse_embedder", sparse_embedder)
-    hybrid_pipeline.add_component("dense_embedder", dense_embedder)
+    hybrid_pipeline.add_component("embedders", embedders)
     hybrid_pipeline.add_component("retriever", retriever)
     hybrid_pipeline.add_component("ranker", ranker)
     hybrid_pipeline.add_component("prompt_builder", prompt_builder)
     hybrid_pipeline.add_component("llm", llm)
 
-    hybrid_pipeline.connect("sparse_embedder.sparse_embedding", "retriever.query_sparse_embedding")
-    hybrid_pipeline.connect("dense_embedder.embedding", "retriever.query_embedding")
+    hybrid_pipeline.connect("embedders.sparse_embedding", "retriever.query_sparse_embedding")
+    hybrid_pipeline.connect("embedders.embedding", "retriever.query_embedding")
     hybrid_pipeline.connect("retriever.documents", "ranker.documents")
     hybrid_pipeline.connect("ranker.documents", "prompt_builder.documents")
     hybrid_pipeline.connect("prompt_builder", "llm")
@@ -1,7 +1,15 @@
+import asyncio
+import threading
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
+from cachetools import TTLCache
+from haystack import Document
+from haystack.dataclasses import StreamingChunk
 from pydantic import BaseModel
 
+from src.config import get_settings
 from .pipeline_manager import pipeline_manager
 
 # --- Pydantic Models for internal data transfer ---
@@ -9,11 +17,53 @@ from .pipeline_manager import pipeline_manager
 class RAGInput(BaseModel):
     question: str
     top_k: int
+    # When False, only the LLM output is collected from the pipeline and `documents` is empty
+    return_documents: bool = True
 
 class RAGResult(BaseModel):
     answer: str
     documents: List[Dict[str, Any]]
 
+# --- Document Serialization ---
+
+def fast_docs_to_dict(docs: List[Document]) -> List[Dict[str, Any]]:
+    """
+    Converts retrieved Documents to flat dicts ({id, content, score, **meta}).
+
+    Cheaper than Document.to_dict(), which inspects every dataclass field and also
+    copies the embeddings, which the API never returns.
+    """
+    return [{"id": doc.id, "content": doc.content, "score": doc.score, **doc.meta} for doc in docs]
+
+# --- Query Execution Pool ---
+
+@lru_cache(maxsize=1)
+def get_query_pool() -> ThreadPoolExecutor:
+    """
+    Dedicated, bounded pool for RAG queries. It applies back-pressure under load and
+    keeps slow pipelines from starving the default executor used by the rest of the app.
+    """
+    return ThreadPoolExecutor(max_workers=get_settings().QUERY_CONCURRENCY, thread_name_prefix="rag-query")
+
+# --- Query Result Cache ---
+
+_result_cache_lock = threading.RLock()
+
+@lru_cache(maxsize=1)
+def _get_result_cache() -> Optional[TTLCache]:
+    """Returns the process-wide answer cache, or None if it is disabled in the settings."""
+    settings = get_settings()
+    if settings.PIPELINE_CACHE_SIZE <= 0:
+        return None
+    return TTLCache(maxsize=settings.PIPELINE_CACHE_SIZE, ttl=settings.PIPELINE_CACHE_TTL_S)
+
+def _normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, used as cache key."""
+    return " ".join(question.lower().split())
+
+# Pipeline outputs needed when the caller doesn't want the documents
+_ANSWER_ONLY = frozenset({"llm"})
+
 # --- Base Strategy Definition ---
 
 class BaseRAGStrategy(ABC):
@@ -23,9 +73,15 @@ class BaseRAGStrategy(ABC):
     of building pipelines and processing results.
     """
     def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+        # Resolved once here so the per-request path reads plain attributes
+        # instead of calling the strategy hooks on every query.
+        self._strategy_name = self.get_strategy_name()
+        self._components_to_include = frozenset(self._get_components_to_include())
         # Each strategy instance is tied to a specific collection
         # and will use the pipeline_manager to get its pipeline.
-        self.pipeline = pipeline_manager.get_pipeline(collection_name, self.get_strategy_name())
+        self.pipeline = pipeline_manager.get_pipeline(collection_name, self._strategy_name)
+        self._pipeline_run = self.pipeline.run
 
     @abstractmethod
     def get_strategy_name(self) -> str:
@@ -48,13 +104,90 @@ class BaseRAGStrategy(ABC):
         raise NotImplementedError
 
     def run(self, request: RAGInput) -> RAGResult:
-        """Executes the full RAG process for a given input."""
+        """
+        Executes the full RAG process for a given input.
+
+        Results are cached for PIPELINE_CACHE_TTL_S seconds, so a repeated question
+        skips embedding, retrieval, ranking and the LLM call.
+        """
+        cache = _get_result_cache()
+        if cache is None:
+            return self._run_pipeline(request)
+
+        key = self._cache_key(request)
+        with _result_cache_lock:
+            cached = cache.get(key)
+        if cached is not None:
+            # Copy so callers can't alter the cached instance
+            return cached.model_copy()
+
+        result = self._run_pipeline(request)
+        with _result_cache_lock:
+            cache[key] = result
+        return result.model_copy()
+
+    def _cache_key(self, request: RAGInput) -> Tuple[str, str, str, int, bool]:
+        """Result cache key; answers without documents are cached separately."""
+        return (
+            self.collection_name, self._strategy_name, _normalize_question(request.question),
+            request.top_k, request.return_documents
+        )
+
+    async def arun(self, request: RAGInput) -> RAGResult:
+        """Runs the query in the query pool, without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_query_pool(), self.run, request)
+
+    async def astream(self, request: RAGInput) -> AsyncIterator[str]:
+        """
+        Runs the query in the query pool and yields the answer text as the LLM
+        generates it. Retrieval/ranking still complete before the first token.
+        """
+        cache = _get_result_cache()
+        key = self._cache_key(request)
+        if cache is not None:
+            with _result_cache_lock:
+                cached = cache.get(key)
+            if cached is not None:
+                yield cached.answer
+                return
+
+        loop = asyncio.get_running_loop()
+        tokens: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+        def on_chunk(chunk: StreamingChunk) -> None:
+            # Called from the pool thread running the generator
+            loop.call_soon_threadsafe(tokens.put_nowait, chunk.content)
+
+        def run_streaming() -> RAGResult:
+            try:
+                return self._run_pipeline(request, streaming_callback=on_chunk)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+
+        future = loop.run_in_executor(get_query_pool(), run_streaming)
+        while (token := await tokens.get()) is not None:
+            if token:
+                yield token
+
+        result = await future  # Re-raises pipeline errors
+        if cache is not None:
+            with _result_cache_lock:
+                cache[key] = result
+
+    def _run_pipeline(
+        self, request: RAGInput, streaming_callback: Optional[Callable[[StreamingChunk], None]] = None
+    ) -> RAGResult:
+        """Runs the pipeline, bypassing the result cache."""
         pipeline_input = self.prepare_input(request)
-        components_to_include = self._get_components_to_include()
-        
+        if streaming_callback is not None:
+            pipeline_input["llm"] = {"streaming_callback": streaming_callback}
+
         # The pipeline is run here
-        result = self.pipeline.run(pipeline_input, include_outputs_from=components_to_include)
-        
+        # Intermediate outputs (retrieved/ranked documents) are only kept if the caller wants them
+        components_to_include = self._components_to_include if request.return_documents else _ANSWER_ONLY
+        result = self._pipeline_run(pipeline_input, include_outputs_from=components_to_include)
+
         return self.extract_output(result)
 
 # --- Concrete Strategy Implementations ---
@@ -77,9 +210,10 @@ class NaiveRAGStrategy(BaseRAGStrategy):
     def extract_output(self, result: Dict[str, Any]) -> RAGResult:
         answer = result["llm"]["replies"][0]
         docs = result.get("retriever", {}).get("documents", [])
-        # Convert Haystack Document objects to dictionaries
-        doc_dicts = [doc.to_dict() for doc in docs]
-        return RAGResult(answer=answer, documents=doc_dicts)
+        # Convert Haystack Document objects to dictionaries (absent if not requested)
+        doc_dicts = fast_docs_to_dict(docs) if docs else []
+        # Trusted internal data: skip Pydantic validation
+        return RAGResult.model_construct(answer=answer, documents=doc_dicts)
 
 
 class HybridRAGStrategy(BaseRAGStrategy):
@@ -90,8 +224,7 @@ class HybridRAGStrategy(BaseRAGStrategy):
 
     def prepare_input(self, request: RAGInput) -> Dict[str, Any]:
         return {
-            "dense_embedder": {"text": request.question},
-            "sparse_embedder": {"text": request.question},
+            "embedders": {"text": request.question},
             "retriever": {"top_k": request.top_k},
             "ranker": {"query": request.question, "top_k": request.top_k}
         }
@@ -103,9 +236,10 @@ class HybridRAGStrategy(BaseRAGStrategy):
         answer = result["llm"]["replies"][0]
         # In this pipeline, the ranker holds the final documents
         docs = result.get("ranker", {}).get("documents", [])
-        # Convert Haystack Document objects to dictionaries
-        doc_dicts = [doc.to_dict() for doc in docs]
-        return RAGResult(answer=answer, documents=doc_dicts)
+        # Convert Haystack Document objects to dictionaries (absent if not requested)
+        doc_dicts = fast_docs_to_dict(docs) if docs else []
+        # Trusted internal data: skip Pydantic validation
+        return RAGResult.model_construct(answer=answer, documents=doc_dicts)
 
 
 # --- Strategy Factory ---
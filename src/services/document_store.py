@@ -1,36 +1,113 @@
 
+from haystack.utils import Secret
 from haystack_integrations.document_stores.qdrant import QdrantDocumentStore
+from qdrant_client import QdrantClient
 import os
+import threading
+from functools import lru_cache
+from typing import Any, Dict
 
-from src.config import settings
+from src.config import get_settings
+
+# One store per collection, shared by every pipeline. The embedded Qdrant locks its
+# storage folder, so a second client on the same path would fail; with a Qdrant server,
+# it keeps one connection pool per collection.
+_stores: Dict[str, QdrantDocumentStore] = {}
+_stores_lock = threading.Lock()
 
 def get_document_store(collection_name: str, use_sparse: bool = False) -> QdrantDocumentStore:
     """
-    Initializes and returns a QdrantDocumentStore for a specific collection.
+    Returns the QdrantDocumentStore for a specific collection, creating it on first use.
+
+    Whether the store uses sparse embeddings is decided once, from the collection's
+    own vector config, so the naive and hybrid pipelines share the same store in
+    whichever order they are built. A sparse-enabled store also serves dense-only queries.
 
     This function centralizes the connection to Qdrant, ensuring consistent
     configuration across the application.
 
     Args:
         collection_name: The name of the Qdrant collection to connect to.
-        use_sparse: Whether to enable sparse embeddings for hybrid search.
+        use_sparse: Whether sparse embeddings are required (hybrid search).
 
     Returns:
         An instance of QdrantDocumentStore connected to the specified collection.
+
+    Raises:
+        FileNotFoundError: If the collection doesn't exist.
+        ValueError: If use_sparse is requested for a collection ingested without sparse embeddings.
+    """
+    with _stores_lock:
+        store = _stores.get(collection_name)
+        if store is None:
+            store = _create_document_store(collection_name)
+            _stores[collection_name] = store
+    if use_sparse and not store.use_sparse_embeddings:
+        raise ValueError(
+            f"Knowledge base '{collection_name}' has no sparse embeddings. "
+            f"Re-run the ingestion script with --hybrid to use the 'hybrid' strategy."
+        )
+    return store
+
+def qdrant_connection_kwargs(collection_name: str) -> Dict[str, Any]:
     """
+    Returns the QdrantDocumentStore connection arguments for a collection: the
+    Qdrant server when QDRANT_URL is set, otherwise its embedded on-disk database.
+    """
+    settings = get_settings()
+    if settings.QDRANT_URL:
+        api_key = Secret.from_env_var("QDRANT_API_KEY") if settings.QDRANT_API_KEY else None
+        return {"url": settings.QDRANT_URL, "api_key": api_key, "prefer_grpc": True}
+
     # The path where the local Qdrant database for this specific collection will be stored.
-    db_path = os.path.join(settings.VECTOR_STORE_PATH, collection_name)
+    return {"path": os.path.join(settings.VECTOR_STORE_PATH, collection_name)}
 
-    # --- FIX: Check if the knowledge base directory actually exists ---
+@lru_cache(maxsize=1)
+def _get_server_client() -> QdrantClient:
+    """Client used to check for collections on the Qdrant server."""
+    settings = get_settings()
+    api_key = settings.QDRANT_API_KEY.get_secret_value() if settings.QDRANT_API_KEY else None
+    return QdrantClient(url=settings.QDRANT_URL, api_key=api_key, prefer_grpc=True)
+
+def _collection_has_sparse(collection_name: str, connection: Dict[str, Any]) -> bool:
+    """
+    Reads the collection's vector config to tell whether it was ingested with sparse
+    embeddings. Raises FileNotFoundError if the collection doesn't exist.
+    """
+    settings = get_settings()
+    if settings.QDRANT_URL:
+        client = _get_server_client()
+        location = f"on Qdrant server {settings.QDRANT_URL}"
+    else:
+        if not os.path.exists(connection["path"]):
+            client = None
+        else:
+            # Short-lived client: it must release the folder lock before the store opens it
+            client = QdrantClient(path=connection["path"])
+        location = f"at path: {connection['path']}"
+
+    try:
+        if client is None or not client.collection_exists(collection_name):
+            raise FileNotFoundError(
+                f"Knowledge base '{collection_name}' not found {location}. "
+                f"Please run the ingestion script first for this collection."
+            )
+        return bool(client.get_collection(collection_name).config.params.sparse_vectors)
+    finally:
+        if client is not None and not settings.QDRANT_URL:
+            client.close()
+
+def _create_document_store(collection_name: str) -> QdrantDocumentStore:
+    """Opens a new QdrantDocumentStore for the collection."""
+    settings = get_settings()
+    connection = qdrant_connection_kwargs(collection_name)
+
+    # --- FIX: Check if the knowledge base actually exists ---
     # If not, raise an error instead of letting Qdrant create an empty one.
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(
-            f"Knowledge base '{collection_name}' not found at path: {db_path}. "
-            f"Please run the ingestion script first for this collection."
-        )
+    use_sparse = _collection_has_sparse(collection_name, connection)
 
     return QdrantDocumentStore(
-        path=db_path,
+        **connection,
         index=collection_name,
         use_sparse_embeddings=use_sparse,
         embedding_dim=settings.EMBEDDING_DIM,
@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src.config import get_settings
+
+# (provider, model, text)
+EmbeddingKey = Tuple[str, str, str]
+
+class EmbeddingCache:
+    """
+    Thread-safe, bounded LRU cache of query embeddings.
+
+    Vectors are stored as float16 to halve their memory footprint; they are
+    only widened back to Python floats when read, at the retriever boundary.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[EmbeddingKey, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: EmbeddingKey) -> Optional[List[float]]:
+        """Returns the cached embedding for the key, or None if it isn't cached."""
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is None:
+                return None
+            self._data.move_to_end(key)
+        # tolist() widens float16 straight to Python floats, no float32 copy needed
+        return vector.tolist()
+
+    def put(self, key: EmbeddingKey, embedding: List[float]) -> List[float]:
+        """
+        Stores an embedding, evicting the least recently used one if the cache is full.
+        Returns the stored (float16-rounded) vector, the same value later hits return.
+        """
+        vector = np.asarray(embedding, dtype=np.float16)
+        with self._lock:
+            self._data[key] = vector
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return vector.tolist()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+@lru_cache(maxsize=1)
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Returns the process-wide embedding cache, or None if it is disabled in the settings."""
+    maxsize = get_settings().EMBEDDING_CACHE_SIZE
+    return EmbeddingCache(maxsize) if maxsize > 0 else None
@@ -0,0 +1,13 @@
+from scraper import WebScraperRAG
+
+
+def test_relative_link_under_directory_url():
+    scraper = WebScraperRAG('http://127.0.0.1:8765/docs/')
+    links = list(scraper.extract_links(['guide.html'], 'http://127.0.0.1:8765/docs/'))
+    assert links == [('http://127.0.0.1:8765/docs/guide.html', 'http://127.0.0.1:8765/docs/guide.html')]
+
+
+def test_relative_link_keeps_real_url_and_canonical_key():
+    scraper = WebScraperRAG('https://Example.com:443/docs/')
+    links = list(scraper.extract_links(['intro'], 'https://Example.com:443/docs/'))
+    assert links == [('https://Example.com:443/docs/intro', 'https://example.com/docs/intro')]